@@ -1,42 +1,69 @@
-from flask import Flask, jsonify
-import time
+from quart import Quart, Response
+import asyncio
+import math
+import orjson
 import sys
 import os
+from typing import Final
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 # Configuration: Can inject delay via environment variable
-ARTIFICIAL_DELAY = float(os.environ.get('BACKEND_DELAY', '0'))
+ARTIFICIAL_DELAY: Final[float] = float(os.environ.get('BACKEND_DELAY', '0'))
+
+# Load shedding: at most MAX_INFLIGHT product requests are served at once,
+# the rest queue for up to QUEUE_TIMEOUT seconds before getting a 503
+MAX_INFLIGHT: Final[int] = int(os.environ.get('BACKEND_MAX_INFLIGHT', '32'))
+QUEUE_TIMEOUT: Final[float] = float(os.environ.get('BACKEND_QUEUE_TIMEOUT', '1.5'))
+_SEM = asyncio.Semaphore(MAX_INFLIGHT)
+_OVERLOADED_JSON = orjson.dumps({'status': 'error', 'error': 'backend overloaded'})
+_OVERLOADED_HEADERS = {'Retry-After': str(max(1, math.ceil(ARTIFICIAL_DELAY)))}
+
+# The product catalog is static, so serialize it once at import
+_PRODUCTS_JSON = orjson.dumps({
+    'status': 'success',
+    'products': [
+        {"id": 1, "name": "Laptop", "price": 999.99},
+        {"id": 2, "name": "Mouse", "price": 29.99},
+        {"id": 3, "name": "Keyboard", "price": 79.99},
+        {"id": 4, "name": "Monitor", "price": 349.99}
+    ],
+    'source': 'backend-database'
+})
 
 @app.route('/health')
-def health():
+async def health():
     """Health check endpoint"""
-    return jsonify({
+    return Response(orjson.dumps({
         'status': 'healthy',
         'service': 'backend',
         'delay_configured': f'{ARTIFICIAL_DELAY}s'
-    }), 200
+    }), status=200, mimetype='application/json')
 
 @app.route('/api/products')
-def get_products():
+async def get_products():
     """Simulated data API that can be slowed down"""
-    # Simulate processing time or chaos-injected delay
-    if ARTIFICIAL_DELAY > 0:
-        print(f"[BACKEND] Sleeping for {ARTIFICIAL_DELAY} seconds (chaos injection)")
-        time.sleep(ARTIFICIAL_DELAY)
-    
-    products = [
-        {"id": 1, "name": "Laptop", "price": 999.99},
-        {"id": 2, "name": "Mouse", "price": 29.99},
-        {"id": 3, "name": "Keyboard", "price": 79.99},
-        {"id": 4, "name": "Monitor", "price": 349.99}
-    ]
+    try:
+        async with asyncio.timeout(QUEUE_TIMEOUT):
+            await _SEM.acquire()
+    except TimeoutError:
+        print(f"[BACKEND] {MAX_INFLIGHT} requests in flight, shedding load")
+        return Response(
+            _OVERLOADED_JSON,
+            status=503,
+            mimetype='application/json',
+            headers=_OVERLOADED_HEADERS
+        )
     
-    return jsonify({
-        'status': 'success',
-        'products': products,
-        'source': 'backend-database'
-    }), 200
+    try:
+        # Simulate processing time or chaos-injected delay
+        if ARTIFICIAL_DELAY > 0:
+            print(f"[BACKEND] Sleeping for {ARTIFICIAL_DELAY} seconds (chaos injection)")
+            await asyncio.sleep(ARTIFICIAL_DELAY)
+        
+        return Response(_PRODUCTS_JSON, status=200, mimetype='application/json')
+    finally:
+        _SEM.release()
 
 if __name__ == '__main__':
     # Write PID for chaos experiments
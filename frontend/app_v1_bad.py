@@ -1,11 +1,36 @@
-from flask import Flask, jsonify, render_template_string
-import requests
+from quart import Quart, Response
+from quart_compress import Compress
+import httpx
+import orjson
 import os
+from typing import Final
 
-app = Flask(__name__)
+app = Quart(__name__)
 
-BACKEND_URL = os.environ.get('BACKEND_URL', 'http://127.0.0.1:5001')
-FRONTEND_TIMEOUT = 1.0  # Frontend only waits 1 second!
+# Compress HTML responses for clients that accept it
+app.config['COMPRESS_MIN_SIZE'] = 512
+Compress(app)
+
+BACKEND_URL: Final[str] = os.environ.get('BACKEND_URL', 'http://127.0.0.1:5001')
+PRODUCTS_URL: Final[str] = f'{BACKEND_URL}/api/products'
+FRONTEND_TIMEOUT: Final[float] = 1.0  # Frontend only waits 1 second!
+
+# Shared keep-alive connection pool for all backend calls, opened at startup
+client = None
+
+@app.before_serving
+async def open_backend_client():
+    """Create the pooled HTTP client so backend connections are reused"""
+    global client
+    client = httpx.AsyncClient(
+        timeout=FRONTEND_TIMEOUT,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=50)
+    )
+
+@app.after_serving
+async def close_backend_client():
+    """Close pooled backend connections on shutdown"""
+    await client.aclose()
 
 # Simple HTML template for visualization
 HTML_TEMPLATE = """
@@ -27,62 +52,63 @@ HTML_TEMPLATE = """
         <h1>E-Commerce Store</h1>
         <p class="version">Frontend Version 1 (Bad - No Resilience)</p>
         <h2>Products</h2>
-        {{ content | safe }}
+        {% if error %}
+        <div class="error">
+            <h3>❌ ERROR: {{ error }}</h3>
+            {% for line in details %}
+            <p>{{ line }}</p>
+            {% endfor %}
+            <p>Complete failure - no products displayed.</p>
+        </div>
+        {% else %}
+        <div class="success">Successfully loaded products from backend!</div>
+        {% for product in products %}
+        <div class="product">
+            <strong>{{ product.name }}</strong> - ${{ product.price }}
+        </div>
+        {% endfor %}
+        {% endif %}
     </div>
 </body>
 </html>
 """
 
+# Compiled once at import instead of re-parsing on every request
+_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+
 @app.route('/')
-def index():
+async def index():
     """Main page - fetches products from backend"""
     try:
         # BAD: Just throws exception if backend is slow/unavailable!
-        response = requests.get(
-            f'{BACKEND_URL}/api/products',
-            timeout=FRONTEND_TIMEOUT
-        )
+        response = await client.get(PRODUCTS_URL)
         response.raise_for_status()
         
-        data = response.json()
-        products_html = '<div class="success">Successfully loaded products from backend!</div>'
-        
-        for product in data['products']:
-            products_html += f'''
-            <div class="product">
-                <strong>{product['name']}</strong> - ${product['price']}
-            </div>
-            '''
-        
-        return render_template_string(HTML_TEMPLATE, content=products_html)
+        data = orjson.loads(response.content)
+        return await _TEMPLATE.render_async(products=data['products'])
     
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         # BAD: Just shows error to user!
-        error_html = '''
-        <div class="error">
-            <h3>❌ ERROR: Backend timeout!</h3>
-            <p>Backend took too long to respond (> 1 second)</p>
-            <p>Complete failure - no products displayed.</p>
-        </div>
-        '''
-        return render_template_string(HTML_TEMPLATE, content=error_html), 503
+        return await _TEMPLATE.render_async(
+            error='Backend timeout!',
+            details=['Backend took too long to respond (> 1 second)']
+        ), 503
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # BAD: Just shows error to user!
-        error_html = f'''
-        <div class="error">
-            <h3>❌ ERROR: Backend unavailable!</h3>
-            <p>Cannot connect to backend service.</p>
-            <p>Error: {str(e)}</p>
-            <p>Complete failure - no products displayed.</p>
-        </div>
-        '''
-        return render_template_string(HTML_TEMPLATE, content=error_html), 503
+        return await _TEMPLATE.render_async(
+            error='Backend unavailable!',
+            details=['Cannot connect to backend service.', f'Error: {e}']
+        ), 503
 
 @app.route('/health')
-def health():
+async def health():
     """Health check - but doesn't verify backend connectivity"""
-    return jsonify({'status': 'healthy', 'service': 'frontend-v1'}), 200
+    return Response(
+        orjson.dumps({'status': 'healthy', 'service': 'frontend-v1'}),
+        status=200,
+        mimetype='application/json'
+    )
 
 if __name__ == '__main__':
     with open('frontend.pid', 'w') as f:
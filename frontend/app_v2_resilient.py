@@ -1,14 +1,43 @@
-from flask import Flask, jsonify, render_template_string
-import requests
+from quart import Quart, Response, request
+from quart_compress import Compress
+from markupsafe import Markup
+import asyncio
+import httpx
+import orjson
+import math
 import time
+import threading
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from enum import Enum
+from typing import Final
 
-app = Flask(__name__)
+app = Quart(__name__)
 
-BACKEND_URL = os.environ.get('BACKEND_URL', 'http://127.0.0.1:5001')
-FRONTEND_TIMEOUT = 1.0
+# Compress HTML responses for clients that accept it
+app.config['COMPRESS_MIN_SIZE'] = 512
+Compress(app)
+
+BACKEND_URL: Final[str] = os.environ.get('BACKEND_URL', 'http://127.0.0.1:5001')
+PRODUCTS_URL: Final[str] = f'{BACKEND_URL}/api/products'
+FRONTEND_TIMEOUT: Final[float] = 1.0
+
+# Shared keep-alive connection pool for all backend calls, opened at startup
+client = None
+
+@app.before_serving
+async def open_backend_client():
+    """Create the pooled HTTP client so backend connections are reused"""
+    global client
+    client = httpx.AsyncClient(
+        timeout=FRONTEND_TIMEOUT,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=50)
+    )
+
+@app.after_serving
+async def close_backend_client():
+    """Close pooled backend connections on shutdown"""
+    await client.aclose()
 
 # Circuit Breaker State
 class CircuitState(Enum):
@@ -16,64 +45,123 @@ class CircuitState(Enum):
     OPEN = "open"          # Backend is down, fail fast
     HALF_OPEN = "half_open"  # Testing if backend recovered
 
+class CircuitBreakerOpen(Exception):
+    """Raised when the circuit breaker rejects a call without trying it"""
+
 class CircuitBreaker:
     """Simple circuit breaker implementation"""
     def __init__(self, failure_threshold=3, timeout=30):
         self.failure_threshold = failure_threshold
         self.timeout = timeout  # seconds to wait before retry
         self.failure_count = 0
-        self.last_failure_time = None
+        self.last_failure_time = None  # time.monotonic() of the last failure
         self.state = CircuitState.CLOSED
+        self._half_open_in_flight = 0
+        # Guards all state; never held across an await
+        self._lock = threading.Lock()
     
-    def call(self, func, *args, **kwargs):
-        """Execute function with circuit breaker protection"""
-        # If circuit is OPEN, check if we should try again
-        if self.state == CircuitState.OPEN:
-            if datetime.now() - self.last_failure_time > timedelta(seconds=self.timeout):
-                print("[CIRCUIT BREAKER] Timeout expired, entering HALF_OPEN state")
-                self.state = CircuitState.HALF_OPEN
-            else:
-                raise Exception("Circuit breaker is OPEN - failing fast")
-        
-        try:
-            result = func(*args, **kwargs)
+    def _admit(self):
+        """Check whether a call may proceed, returns True for a HALF_OPEN probe"""
+        with self._lock:
+            # If circuit is OPEN, check if we should try again
+            if self.state == CircuitState.OPEN:
+                if time.monotonic() - self.last_failure_time > self.timeout:
+                    print("[CIRCUIT BREAKER] Timeout expired, entering HALF_OPEN state")
+                    self.state = CircuitState.HALF_OPEN
+                else:
+                    raise CircuitBreakerOpen("Circuit breaker is OPEN - failing fast")
+            
+            # Only one probe at a time may test a recovering backend
+            if self.state == CircuitState.HALF_OPEN:
+                if self._half_open_in_flight:
+                    raise CircuitBreakerOpen("Circuit breaker is HALF_OPEN - probe in progress, failing fast")
+                self._half_open_in_flight += 1
+                return True
+            return False
+    
+    @staticmethod
+    def _is_failure(error):
+        """Only timeouts, connection errors and 5xx responses count as backend failures"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+    
+    def _record_success(self):
+        with self._lock:
             # Success! Reset failure count
             if self.state == CircuitState.HALF_OPEN:
                 print("[CIRCUIT BREAKER] Backend recovered, closing circuit")
             self.failure_count = 0
             self.state = CircuitState.CLOSED
-            return result
-        
-        except Exception as e:
+    
+    def _record_failure(self):
+        with self._lock:
             self.failure_count += 1
-            self.last_failure_time = datetime.now()
+            self.last_failure_time = time.monotonic()
             
             if self.failure_count >= self.failure_threshold:
                 print(f"[CIRCUIT BREAKER] Threshold reached ({self.failure_count}), opening circuit")
                 self.state = CircuitState.OPEN
-            
-            raise e
+    
+    async def call(self, func, *args, **kwargs):
+        """Await coroutine function with circuit breaker protection"""
+        probe = self._admit()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if self._is_failure(e):
+                self._record_failure()
+            elif isinstance(e, httpx.HTTPStatusError):
+                # A 4xx means the backend answered, so it doesn't trip the circuit
+                self._record_success()
+            # Anything else (e.g. a malformed body) records neither outcome
+            raise
+        else:
+            self._record_success()
+            return result
+        finally:
+            if probe:
+                with self._lock:
+                    self._half_open_in_flight -= 1
+    
+    def seconds_until_retry(self):
+        """Seconds until an OPEN circuit admits a probe, 0 if not OPEN"""
+        with self._lock:
+            if self.state != CircuitState.OPEN:
+                return 0
+            return max(0, self.timeout - (time.monotonic() - self.last_failure_time))
+    
+    def snapshot(self):
+        """Return a consistent copy of state, failure count and last failure time"""
+        with self._lock:
+            return self.state, self.failure_count, self.last_failure_time
 
 # Global circuit breaker instance
 circuit_breaker = CircuitBreaker(failure_threshold=3, timeout=30)
 
-# Cache for graceful degradation
+# Fixed body for clients asking to be rejected cheaply while the circuit is OPEN
+_CIRCUIT_OPEN_JSON = orjson.dumps({'circuit': 'open'})
+
+# Cache for graceful degradation (stale-while-revalidate)
 product_cache = {
     'data': None,
     'timestamp': None,
-    'ttl': 300  # 5 minutes
+    'soft_ttl': 30,  # after 30 seconds, serve stale data and refresh in background
+    'ttl': 300,  # 5 minutes, after which the cache is not used at all
+    'refreshing': False
 }
 
 def get_cached_products():
-    """Return cached products if available"""
+    """Return (cached products, is_stale), or (None, False) if unavailable"""
     if product_cache['data'] is None:
-        return None
+        return None, False
     
     # Check if cache is still valid
-    if datetime.now() - product_cache['timestamp'] > timedelta(seconds=product_cache['ttl']):
-        return None
+    age = time.monotonic() - product_cache['timestamp']
+    if age > product_cache['ttl']:
+        return None, False
     
-    return product_cache['data']
+    return product_cache['data'], age > product_cache['soft_ttl']
 
 def get_fallback_products():
     """Static fallback data when backend is unavailable"""
@@ -83,21 +171,54 @@ def get_fallback_products():
         {"id": 0, "name": "Keyboard (cached)", "price": 79.99}
     ]
 
-def fetch_from_backend():
+async def fetch_from_backend():
     """Fetch products from backend with timeout"""
-    response = requests.get(
-        f'{BACKEND_URL}/api/products',
-        timeout=FRONTEND_TIMEOUT
-    )
+    response = await client.get(PRODUCTS_URL)
     response.raise_for_status()
-    data = response.json()
+    data = orjson.loads(response.content)
     
     # Update cache on successful fetch
     product_cache['data'] = data['products']
-    product_cache['timestamp'] = datetime.now()
+    product_cache['timestamp'] = time.monotonic()
     
     return data['products'], 'backend'
 
+# Backend fetch currently in flight, shared by all concurrent callers
+_inflight = None
+
+def _clear_inflight(task):
+    global _inflight
+    _inflight = None
+    # Retrieve the outcome even if every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+async def fetch_from_backend_singleflight():
+    """Join the in-flight backend fetch, or start one if none is running"""
+    global _inflight
+    if _inflight is None:
+        _inflight = asyncio.create_task(circuit_breaker.call(fetch_from_backend))
+        _inflight.add_done_callback(_clear_inflight)
+    # Shield so one caller disconnecting does not cancel the fetch for the rest
+    return await asyncio.shield(_inflight)
+
+async def refresh_product_cache():
+    """Background task refreshing stale cache entries from the backend"""
+    try:
+        await fetch_from_backend_singleflight()
+    except Exception as e:
+        print(f"[FRONTEND V2] Background cache refresh failed: {e}")
+    finally:
+        product_cache['refreshing'] = False
+
+def schedule_cache_refresh():
+    """Start a background refresh unless one is already running"""
+    # No await between check and set, so this is atomic on the event loop
+    if product_cache['refreshing']:
+        return
+    product_cache['refreshing'] = True
+    app.add_background_task(refresh_product_cache)
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -114,6 +235,7 @@ HTML_TEMPLATE = """
         .badge { padding: 4px 8px; border-radius: 4px; font-size: 12px; }
         .badge-live { background: #4caf50; color: white; }
         .badge-cached { background: #ff9800; color: white; }
+        .badge-cached-refreshing { background: #ffc107; color: white; }
         .badge-fallback { background: #2196f3; color: white; }
     </style>
 </head>
@@ -121,35 +243,81 @@ HTML_TEMPLATE = """
     <div class="container">
         <h1>E-Commerce Store</h1>
         <p class="version">Frontend Version 2 (Resilient - With Circuit Breaker & Fallback)</p>
-        <h2>Products {{ badge | safe }}</h2>
-        {{ message | safe }}
-        {{ content | safe }}
+        <h2>Products {{ badge }}</h2>
+        {{ message }}
+        {% for product in products %}
+        <div class="product">
+            <strong>{{ product.name }}</strong> - ${{ product.price }}
+        </div>
+        {% endfor %}
     </div>
 </body>
 </html>
 """
 
+# Compiled once at import instead of re-parsing on every request
+_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+
+# The fallback page is constant apart from the circuit state, so it is
+# rendered once at startup and the state is substituted per request
+_FALLBACK_MESSAGE = Markup('''
+            <div class="info">
+                ℹ️ Backend is temporarily unavailable. Showing default product catalog.
+                <br>Circuit breaker state: __STATE__
+                <br>Full functionality will resume when backend recovers.
+            </div>
+            ''')
+_FALLBACK_BADGE = Markup('<span class="badge badge-fallback">FALLBACK DATA</span>')
+_FALLBACK_PAGE = None
+
+@app.before_serving
+async def prerender_fallback_page():
+    """Render the static fallback page to bytes once"""
+    global _FALLBACK_PAGE
+    html = await _TEMPLATE.render_async(
+        products=get_fallback_products(),
+        message=_FALLBACK_MESSAGE,
+        badge=_FALLBACK_BADGE
+    )
+    _FALLBACK_PAGE = html.encode()
+
 @app.route('/')
-def index():
+async def index():
     """Main page with resilient backend calls"""
+    # Fail fast without rendering for pollers that opt in or only want JSON.
+    # Once the OPEN timeout has expired, fall through so a request can probe.
+    retry_after = circuit_breaker.seconds_until_retry()
+    if retry_after > 0 and (
+            request.headers.get('X-Fast-Fail') == '1'
+            or request.accept_mimetypes.best == 'application/json'):
+        return Response(
+            _CIRCUIT_OPEN_JSON,
+            status=503,
+            mimetype='application/json',
+            headers={'Retry-After': str(math.ceil(retry_after))}
+        )
+    
     products = None
     source = None
     message = ""
     
-    # Try to get from backend with circuit breaker protection
-    try:
-        products, source = circuit_breaker.call(fetch_from_backend)
-        message = '<div class="success">✅ Backend is healthy and responding!</div>'
-        badge = '<span class="badge badge-live">LIVE DATA</span>'
+    # Serve from cache while it is usable (Resilience Pattern: Caching)
+    cached, is_stale = get_cached_products()
+    if cached and not is_stale:
+        products = cached
+        source = 'cache'
+        message = '<div class="success">✅ Showing products recently loaded from backend.</div>'
+        badge = '<span class="badge badge-cached">CACHED DATA</span>'
     
-    except Exception as e:
-        print(f"[FRONTEND V2] Backend call failed: {e}")
-        
-        # Try cache first (Resilience Pattern: Caching)
-        cached = get_cached_products()
-        if cached:
-            products = cached
-            source = 'cache'
+    elif cached:
+        # Stale: answer immediately and refresh off the request path
+        schedule_cache_refresh()
+        products = cached
+        source = 'cache'
+        if circuit_breaker.state == CircuitState.CLOSED:
+            message = '<div class="info">ℹ️ Showing cached data while it is refreshed from backend.</div>'
+            badge = '<span class="badge badge-cached-refreshing">CACHED DATA (REFRESHING)</span>'
+        else:
             message = f'''
             <div class="warning">
                 ⚠️ Backend is slow or unavailable. Showing cached data from earlier.
@@ -157,53 +325,56 @@ def index():
             </div>
             '''
             badge = '<span class="badge badge-cached">CACHED DATA</span>'
-        else:
-            # Use static fallback (Resilience Pattern: Graceful Degradation)
-            products = get_fallback_products()
-            source = 'fallback'
-            message = f'''
-            <div class="info">
-                ℹ️ Backend is temporarily unavailable. Showing default product catalog.
-                <br>Circuit breaker state: {circuit_breaker.state.value}
-                <br>Full functionality will resume when backend recovers.
-            </div>
-            '''
-            badge = '<span class="badge badge-fallback">FALLBACK DATA</span>'
     
-    # Render products
-    products_html = ""
-    for product in products:
-        products_html += f'''
-        <div class="product">
-            <strong>{product['name']}</strong> - ${product['price']}
-        </div>
-        '''
+    else:
+        # No usable cache, so wait for the backend with circuit breaker protection
+        try:
+            products, source = await fetch_from_backend_singleflight()
+            message = '<div class="success">✅ Backend is healthy and responding!</div>'
+            badge = '<span class="badge badge-live">LIVE DATA</span>'
+        
+        except Exception as e:
+            print(f"[FRONTEND V2] Backend call failed: {e}")
+            
+            # Use static fallback (Resilience Pattern: Graceful Degradation)
+            return Response(
+                _FALLBACK_PAGE.replace(b'__STATE__', circuit_breaker.state.value.encode()),
+                status=200,
+                mimetype='text/html'
+            )
     
-    return render_template_string(
-        HTML_TEMPLATE,
-        content=products_html,
-        message=message,
-        badge=badge
+    # Render products; message and badge are our own trusted markup
+    return await _TEMPLATE.render_async(
+        products=products,
+        message=Markup(message),
+        badge=Markup(badge)
     )
 
 @app.route('/health')
-def health():
+async def health():
     """Enhanced health check"""
-    return jsonify({
+    state, failure_count, _ = circuit_breaker.snapshot()
+    return Response(orjson.dumps({
         'status': 'healthy',
         'service': 'frontend-v2',
-        'circuit_breaker_state': circuit_breaker.state.value,
-        'circuit_breaker_failures': circuit_breaker.failure_count
-    }), 200
+        'circuit_breaker_state': state.value,
+        'circuit_breaker_failures': failure_count
+    }), status=200, mimetype='application/json')
 
 @app.route('/circuit-breaker/status')
-def circuit_status():
+async def circuit_status():
     """Debug endpoint to check circuit breaker state"""
-    return jsonify({
-        'state': circuit_breaker.state.value,
-        'failure_count': circuit_breaker.failure_count,
-        'last_failure': circuit_breaker.last_failure_time.isoformat() if circuit_breaker.last_failure_time else None
-    })
+    state, failure_count, last_failure_time = circuit_breaker.snapshot()
+    last_failure = None
+    if last_failure_time is not None:
+        # Convert the monotonic stamp to wall-clock time for display only
+        elapsed = time.monotonic() - last_failure_time
+        last_failure = datetime.fromtimestamp(time.time() - elapsed).isoformat()
+    return Response(orjson.dumps({
+        'state': state.value,
+        'failure_count': failure_count,
+        'last_failure': last_failure
+    }), mimetype='application/json')
 
 if __name__ == '__main__':
     with open('frontend.pid', 'w') as f:
@@ -215,6 +386,6 @@ if __name__ == '__main__':
     print(f"[FRONTEND V2] Timeout: {FRONTEND_TIMEOUT}s")
     print("[FRONTEND V2] ✅ Resilience patterns enabled:")
     print("  - Circuit Breaker (fail fast after 3 failures)")
-    print("  - Caching (5 minute TTL)")
+    print("  - Caching (refreshed in background after 30s, 5 minute TTL)")
     print("  - Graceful Degradation (static fallback)")
     app.run(host='127.0.0.1', port=port, debug=False)